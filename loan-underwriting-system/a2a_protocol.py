@@ -1,11 +1,30 @@
 import asyncio
-import json
+import itertools
+import logging
+import os
+import time
 from typing import Dict, Any, Optional, Callable
 from dataclasses import dataclass
 import uuid
+from collections import deque
 from datetime import datetime
 
-@dataclass
+# Line an agent's MCP server writes to stderr once it is about to serve
+MCP_READY_SENTINEL = "MCP_SERVER_READY"
+
+# [epoch second, ISO string for that second] - reformatted once per second
+_ts_cache = [0, ""]
+
+def now_iso() -> str:
+    """Local-time ISO timestamp, equivalent to datetime.now().isoformat()"""
+    t = time.time()
+    sec = int(t)
+    if sec != _ts_cache[0]:
+        _ts_cache[0] = sec
+        _ts_cache[1] = datetime.fromtimestamp(sec).isoformat()
+    return f"{_ts_cache[1]}.{int((t - sec) * 1_000_000):06d}"
+
+@dataclass(slots=True, frozen=True)
 class A2AMessage:
     """Message structure for agent-to-agent communication"""
     id: str
@@ -17,12 +36,25 @@ class A2AMessage:
     response_to: Optional[str] = None
 
 class A2AProtocol:
-    """Protocol for agent-to-agent communication"""
+    """Protocol for agent-to-agent communication
+
+    Messages are delivered in-process by awaiting the receiver's handler
+    directly, so payloads are passed by reference and never serialized.
+    """
     
     def __init__(self):
         self.agents: Dict[str, Callable] = {}
-        self.message_history = []
+        self.message_history = deque(maxlen=int(os.getenv("A2A_HISTORY_MAX", "1024")))
         self.pending_responses = {}
+        # IDs only need to be unique within this process: nonce + counter
+        self._nonce = uuid.uuid4().hex[:8]
+        self._id_counter = itertools.count()
+        self.debug = bool(os.getenv("A2A_DEBUG"))
+        self.log = logging.getLogger("a2a")
+        if self.debug and not self.log.handlers:
+            # Payload/response dumps are only rendered when A2A_DEBUG is set
+            self.log.addHandler(logging.StreamHandler())
+            self.log.setLevel(logging.DEBUG)
     
     def register_agent(self, agent_name: str, message_handler: Callable):
         """Register an agent with its message handler"""
@@ -44,12 +76,12 @@ class A2AProtocol:
         
         # Create message
         message = A2AMessage(
-            id=str(uuid.uuid4()),
+            id=f"{self._nonce}-{next(self._id_counter)}",
             sender=sender,
             receiver=receiver,
             action=action,
             payload=payload,
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
             response_to=response_to
         )
         
@@ -57,12 +89,14 @@ class A2AProtocol:
         self.message_history.append(message)
         print(f"\n📨 A2A Message: {sender} → {receiver}")
         print(f"   Action: {action}")
-        print(f"   Payload: {json.dumps(payload, indent=2)}")
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("payload=%s", payload)
         
         # Send to receiver and get response
         try:
             response = await self.agents[receiver](message)
-            print(f"   Response: {json.dumps(response, indent=2)}")
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug("response=%s", response)
             return response
         except Exception as e:
             error_response = {
@@ -75,4 +109,4 @@ class A2AProtocol:
     
     def get_message_history(self) -> list:
         """Get message history"""
-        return self.message_history
\ No newline at end of file
+        return list(self.message_history)
\ No newline at end of file
@@ -1,6 +1,8 @@
-from datetime import datetime
+import asyncio
+import traceback
+import sys
 from typing import Dict, Any
-from a2a_protocol import A2AMessage
+from a2a_protocol import A2AMessage, now_iso, MCP_READY_SENTINEL
 
 # Import the MCP tools and core functions
 from server.datafetchertool import (
@@ -20,6 +22,98 @@ def register_a2a(protocol):
     global a2a_protocol
     a2a_protocol = protocol
 
+# A2A action handlers
+async def _do_fetch_and_analyze(message: A2AMessage) -> Dict[str, Any]:
+    data_types = message.payload.get("data_types", [])
+    analysis_type = message.payload.get("analysis_type", "comprehensive")
+    
+    if analysis_type == "comprehensive":
+        # Use the core function directly
+        summary = await intelligent_summarize_core(data_types)
+    else:
+        # Individual analysis, one LLM call per document run concurrently
+        analyses = await asyncio.gather(
+            *(analyze_financial_data_core(data_type) for data_type in data_types)
+        )
+        summary = "\n\n".join(
+            f"{data_type.upper()}:\n{analysis}"
+            for data_type, analysis in zip(data_types, analyses)
+        )
+    
+    return {
+        "status": "success",
+        "message_id": message.id,
+        "summary": summary,
+        "data_types_processed": data_types,
+        "timestamp": now_iso()
+    }
+
+async def _do_fetch_and_analyze_batch(message: A2AMessage) -> Dict[str, Any]:
+    # payload: {"batches": [{"id": ..., "data_types": [...]}, ...]}
+    batches = message.payload.get("batches", [])
+    
+    # Results are keyed by batch id, so check ids before spending any LLM calls
+    ids = [batch.get("id") for batch in batches]
+    if None in ids or len(set(ids)) != len(ids):
+        return {
+            "status": "error",
+            "message_id": message.id,
+            "error": "Every batch needs a unique \"id\"",
+            "timestamp": now_iso()
+        }
+    
+    # Summarize every batch concurrently in a single round trip
+    summaries = await asyncio.gather(
+        *(intelligent_summarize_core(batch.get("data_types", [])) for batch in batches)
+    )
+    
+    return {
+        "status": "success",
+        "message_id": message.id,
+        "results": dict(zip(ids, summaries)),
+        "timestamp": now_iso()
+    }
+
+async def _do_search(message: A2AMessage) -> Dict[str, Any]:
+    business_name = message.payload.get("business_name", "")
+    search_type = message.payload.get("search_type", "general")
+    
+    # Use the core function directly
+    search_results = await search_business_info_core(business_name, search_type)
+    
+    return {
+        "status": "success",
+        "message_id": message.id,
+        "search_results": search_results,
+        "timestamp": now_iso()
+    }
+
+async def _do_list(message: A2AMessage) -> Dict[str, Any]:
+    # Use the core function directly
+    available_data = list_available_data_core()
+    
+    return {
+        "status": "success",
+        "message_id": message.id,
+        "available_data_types": available_data,
+        "timestamp": now_iso()
+    }
+
+def _unknown(message: A2AMessage) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "message_id": message.id,
+        "error": f"Unknown action: {message.action}",
+        "timestamp": now_iso()
+    }
+
+HANDLERS = {
+    "fetch_and_analyze": _do_fetch_and_analyze,
+    "fetch_and_analyze_batch": _do_fetch_and_analyze_batch,
+    "search_business": _do_search,
+    "list_available": _do_list,
+}
+
 # A2A Message Handler
 async def handle_a2a_message(message: A2AMessage) -> Dict[str, Any]:
     """Handle incoming A2A messages from other agents"""
@@ -28,73 +122,22 @@ async def handle_a2a_message(message: A2AMessage) -> Dict[str, Any]:
     print(f"   From: {message.sender}")
     print(f"   Action: {message.action}")
     
-    try:
-        if message.action == "fetch_and_analyze":
-            data_types = message.payload.get("data_types", [])
-            analysis_type = message.payload.get("analysis_type", "comprehensive")
-            
-            if analysis_type == "comprehensive":
-                # Use the core function directly
-                summary = await intelligent_summarize_core(data_types)
-            else:
-                # Individual analysis
-                summaries = []
-                for data_type in data_types:
-                    analysis = await analyze_financial_data_core(data_type)
-                    summaries.append(f"{data_type.upper()}:\n{analysis}")
-                summary = "\n\n".join(summaries)
-            
-            return {
-                "status": "success",
-                "message_id": message.id,
-                "summary": summary,
-                "data_types_processed": data_types,
-                "timestamp": datetime.now().isoformat()
-            }
-        
-        elif message.action == "search_business":
-            business_name = message.payload.get("business_name", "")
-            search_type = message.payload.get("search_type", "general")
-            
-            # Use the core function directly
-            search_results = await search_business_info_core(business_name, search_type)
-            
-            return {
-                "status": "success",
-                "message_id": message.id,
-                "search_results": search_results,
-                "timestamp": datetime.now().isoformat()
-            }
-        
-        elif message.action == "list_available":
-            # Use the core function directly
-            available_data = list_available_data_core()
-            
-            return {
-                "status": "success",
-                "message_id": message.id,
-                "available_data_types": available_data,
-                "timestamp": datetime.now().isoformat()
-            }
-        
-        else:
-            return {
-                "status": "error",
-                "message_id": message.id,
-                "error": f"Unknown action: {message.action}",
-                "timestamp": datetime.now().isoformat()
-            }
+    handler = HANDLERS.get(message.action)
+    if handler is None:
+        return _unknown(message)
     
+    try:
+        return await handler(message)
     except Exception as e:
-        import traceback
         print(f"   Error details: {traceback.format_exc()}")
         return {
             "status": "error",
             "message_id": message.id,
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
 
 # Run the MCP server if this file is executed directly
 if __name__ == "__main__":
+    print(MCP_READY_SENTINEL, file=sys.stderr, flush=True)
     mcp.run()
\ No newline at end of file
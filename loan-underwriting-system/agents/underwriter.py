@@ -1,12 +1,13 @@
 from fastmcp import FastMCP
 import json
+import sys
+from collections import deque
 from typing import Dict, Any
-from datetime import datetime
-from a2a_protocol import A2AMessage
-from llm_provider import LLMProvider
+from a2a_protocol import A2AMessage, now_iso, MCP_READY_SENTINEL
+from llm_provider import get_llm
 
 # Import tool MCP and registration function
-from server.underwritertool import mcp as tool_mcp, register_tool_state
+from server.underwritertool import mcp as tool_mcp, register_tool_state, HISTORY_MAX
 
 # Replace your MCP instance with tool MCP
 mcp = tool_mcp
@@ -14,8 +15,8 @@ mcp = tool_mcp
 # Global variables
 a2a_protocol = None
 current_application = None
-decision_history = []
-llm = LLMProvider()
+decision_history = deque(maxlen=HISTORY_MAX)
+llm = get_llm()
 
 def register_a2a(protocol):
     """Register A2A protocol"""
@@ -41,9 +42,10 @@ async def handle_a2a_message(message: A2AMessage) -> Dict[str, Any]:
     return {
         "status": "acknowledged",
         "message_id": message.id,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
 
 # Run the MCP server
 if __name__ == "__main__":
+    print(MCP_READY_SENTINEL, file=sys.stderr, flush=True)
     mcp.run()
\ No newline at end of file
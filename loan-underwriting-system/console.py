@@ -0,0 +1,115 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+# A read whose prompt was interrupted stays pending and answers the next prompt
+_pending: Optional[Future] = None
+_buffer = bytearray()
+# Set on Ctrl+C at a prompt so the reader can tell an interrupted read from EOF
+_sigint = threading.Event()
+
+
+def _read_fd_line() -> Optional[str]:
+    """Read one line straight from the stdin descriptor; None at end of input.
+
+    sys.stdin is not used so the thread never holds its buffer lock, which
+    would abort interpreter shutdown while the thread is still waiting.
+    """
+    fd = sys.stdin.fileno()
+    while b"\n" not in _buffer:
+        chunk = os.read(fd, 4096)
+        if not chunk:
+            if not _buffer:
+                return None
+            break
+        _buffer.extend(chunk)
+    end = _buffer.find(b"\n")
+    end = len(_buffer) if end == -1 else end + 1
+    line = bytes(_buffer[:end])
+    del _buffer[:end]
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace").rstrip("\r\n")
+
+
+def _read_console_line() -> Optional[str]:
+    """Read one line through sys.stdin; None at end of input.
+
+    Used on Windows, where descriptor reads go through the console code page
+    and only sys.stdin returns the full Unicode text that was typed.
+    """
+    line = sys.stdin.readline()
+    return line.rstrip("\r\n") if line else None
+
+
+def _read_line(result: Future):
+    """Worker thread body: read one line into result"""
+    try:
+        read = _read_console_line if sys.platform == "win32" else _read_fd_line
+        while True:
+            line = read()
+            # A console read cut short by Ctrl+C comes back empty like end of input;
+            # the SIGINT arrives right behind it, so wait briefly before calling it EOF
+            if line is None and _sigint.wait(0.1):
+                _sigint.clear()
+                continue
+            if line is None:
+                raise EOFError
+            result.set_result(line)
+            return
+    except BaseException as e:
+        result.set_exception(e)
+
+
+async def ainput(prompt: str = "") -> str:
+    """Read a line from stdin without blocking the event loop.
+
+    Ctrl+C while waiting raises KeyboardInterrupt here instead of cancelling
+    the running task, so callers keep their usual KeyboardInterrupt handling.
+    """
+    global _pending
+    print(prompt, end="", flush=True)
+    if _pending is None:
+        _pending = Future()
+        _sigint.clear()
+        # Daemon thread: exiting the program never waits for a line on stdin
+        threading.Thread(target=_read_line, args=(_pending,), daemon=True).start()
+    read = _pending
+
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    interrupted = False
+
+    def _resolve():
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _on_read(_):
+        try:
+            loop.call_soon_threadsafe(_resolve)
+        except RuntimeError:  # loop already closed
+            pass
+
+    def _on_sigint(signum, frame):
+        nonlocal interrupted
+        interrupted = True
+        _sigint.set()
+        loop.call_soon_threadsafe(_resolve)
+
+    read.add_done_callback(_on_read)
+    try:
+        previous = signal.signal(signal.SIGINT, _on_sigint)
+    except ValueError:  # not the main thread; leave SIGINT alone
+        previous = None
+    try:
+        await waiter
+    finally:
+        if previous is not None:
+            signal.signal(signal.SIGINT, previous)
+
+    if interrupted:
+        raise KeyboardInterrupt
+    _pending = None
+    return read.result()
\ No newline at end of file
@@ -1,11 +1,34 @@
-import json
+import asyncio
+import os
+import orjson
+from collections import deque
+from itertools import islice
+from pathlib import Path
 from typing import Dict, Any
 from datetime import datetime
 from server.underwritertool import llm_analyze_application, make_llm_decision
-from llm_provider import LLMProvider
+from llm_provider import get_llm
+from a2a_protocol import now_iso
+from console import ainput
 
 # Import required modules
 
+SESSION_HISTORY_MAX = int(os.getenv("SESSION_HISTORY_MAX", "1024"))
+PREVIEW_WIDTH = 2000
+
+def _dumps(obj, indent: bool = False) -> str:
+    """Serialize to a JSON string using orjson"""
+    opt = orjson.OPT_NON_STR_KEYS
+    if indent:
+        opt |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, option=opt).decode()
+
+def _preview(text: str, width: int = PREVIEW_WIDTH) -> str:
+    """Truncate long text for console display, keeping its line breaks"""
+    if len(text) <= width:
+        return text
+    return text[:width].rstrip() + " …[truncated, full text kept for decision and export]"
+
 class InteractiveLoanSession:
     """Manages an interactive loan underwriting session"""
     
@@ -13,13 +36,53 @@ class InteractiveLoanSession:
         self.system = system
         self.application = application
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=SESSION_HISTORY_MAX)
         self.fetched_documents = {}
-        self.ai_assessments = []
+        self.ai_assessments = deque(maxlen=SESSION_HISTORY_MAX)
         self.additional_notes = []
         self.current_decision = None
         self.session_active = True
+        self.llm = get_llm()
+        self._ctx_cache = None
+        self._ctx_version = 0
+        # Command name -> handler taking the rest of the command line, unaltered
+        self._commands = {
+            "exit": self.confirm_exit,
+            "help": lambda args: self.show_help(),
+            "analyze": lambda args: self.analyze_application(),
+            "fetch": self.fetch_documents,
+            "search": self.search_information,
+            "question": self.ask_ai_question,
+            "review": lambda args: self.review_all_data(),
+            "decision": lambda args: self.make_decision(),
+            "note": self.add_note,
+            "report": lambda args: self.generate_report(),
+            "export": lambda args: self.export_report(),
+            "history": lambda args: self.show_conversation_history(),
+        }
+    
+    def _touch(self):
+        """Mark the question context as stale after session data changes"""
+        self._ctx_version += 1
+    
+    def _question_context(self) -> str:
+        """Serialized application/documents/assessments, rebuilt only when they change"""
+        if self._ctx_cache and self._ctx_cache[0] == self._ctx_version:
+            return self._ctx_cache[1]
+        
+        context = f"""
+        Application Details:
+        {_dumps(self.application, indent=True)}
+        
+        Fetched Documents:
+        {_dumps(self.fetched_documents, indent=True)}
         
+        Previous Assessments:
+        {_dumps(list(self.ai_assessments), indent=True)}
+        """
+        self._ctx_cache = (self._ctx_version, context)
+        return context
+    
     async def start_session(self):
         """Start the interactive underwriting session"""
         print("\n" + "="*60)
@@ -37,36 +100,22 @@ class InteractiveLoanSession:
         # Interactive loop
         while self.session_active:
             try:
-                command = input("\n[Underwriter]> ").strip().lower()
+                command = (await ainput("\n[Underwriter]> ")).strip()
+                # Only the command word is split off; notes and questions are free text
+                parts = command.split(maxsplit=1)
+                if not parts:
+                    continue
                 
-                if command == "exit":
-                    confirm = input("Exit session? (y/n): ").lower()
-                    if confirm == 'y':
-                        self.session_active = False
-                elif command == "help":
-                    self.show_help()
-                elif command == "analyze":
-                    await self.analyze_application()
-                elif command.startswith("fetch"):
-                    await self.fetch_documents(command)
-                elif command.startswith("search"):
-                    await self.search_information(command)
-                elif command.startswith("question"):
-                    await self.ask_ai_question(command)
-                elif command == "review":
-                    await self.review_all_data()
-                elif command == "decision":
-                    await self.make_decision()
-                elif command.startswith("note"):
-                    self.add_note(command)
-                elif command == "report":
-                    await self.generate_report()
-                elif command == "export":
-                    await self.export_report()
-                elif command == "history":
-                    self.show_conversation_history()
-                else:
+                cmd = parts[0]
+                args = parts[1] if len(parts) > 1 else ""
+                handler = self._commands.get(cmd.lower())
+                if handler is None:
                     print("❌ Unknown command. Type 'help' for available commands.")
+                    continue
+                
+                result = handler(args)
+                if asyncio.iscoroutine(result):
+                    await result
                     
             except KeyboardInterrupt:
                 print("\n⚠️  Use 'exit' to end the session properly")
@@ -76,6 +125,12 @@ class InteractiveLoanSession:
         print("\n✅ Session ended")
         return self.current_decision
     
+    async def confirm_exit(self, args: str):
+        """Ask for confirmation and end the session"""
+        confirm = (await ainput("Exit session? (y/n): ")).lower()
+        if confirm == 'y':
+            self.session_active = False
+    
     def show_help(self):
         """Show available commands"""
         print("\n📚 AVAILABLE COMMANDS:")
@@ -95,16 +150,16 @@ class InteractiveLoanSession:
     
     async def analyze_application(self):
         """Analyze the loan application"""
-        print("\n🔄 Analyzing application...")        
-        llm = LLMProvider()
+        print("\n🔄 Analyzing application...")
         
         # Get AI analysis
         app_analysis = await llm_analyze_application(self.application)
         self.ai_assessments.append({
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "type": "initial_analysis",
             "content": app_analysis
         })
+        self._touch()
         
         print("\n🤖 AI ANALYSIS:")
         print("-" * 40)
@@ -112,38 +167,53 @@ class InteractiveLoanSession:
         print(f"\n📋 Recommended documents: {', '.join(app_analysis['required_documents'])}")
         
         self.conversation_history.append({
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "action": "analyze",
             "result": app_analysis
         })
         
-        # Ask if underwriter wants to fetch recommended documents
-        fetch_all = input("\nFetch all recommended documents? (y/n): ").lower()
-        if fetch_all == 'y':
-            for doc in app_analysis['required_documents']:
-                await self.fetch_single_document(doc)
+        # Start fetching the recommended documents while the underwriter decides
+        prefetch = {
+            doc: asyncio.create_task(self._request_document(doc))
+            for doc in app_analysis['required_documents']
+        }
+        try:
+            # Let each prefetch dispatch its A2A message (and print its log lines)
+            # before the prompt is shown, so the question is not buried under them
+            await asyncio.sleep(0)
+            fetch_all = (await ainput("\nFetch all recommended documents? (y/n): ")).lower()
+            if fetch_all == 'y':
+                for doc, task in prefetch.items():
+                    self._record_document(doc, await task)
+        finally:
+            # Drop any speculative fetches that were declined or still running
+            for task in prefetch.values():
+                task.cancel()
     
-    async def fetch_documents(self, command: str):
+    async def fetch_documents(self, args: str):
         """Fetch specific documents"""
-        parts = command.split()
-        if len(parts) < 2:
+        if not args:
             print("Usage: fetch <document_type>")
             print("Available types: gst, itr, bank_statement, all")
             return
         
-        doc_type = parts[1]
+        doc_type = args.split()[0].lower()
         if doc_type == "all":
             doc_types = ["gst", "itr", "bank_statement"]
-            for dt in doc_types:
-                await self.fetch_single_document(dt)
+            # Each document is an independent A2A round trip, so run them together
+            await asyncio.gather(*(self.fetch_single_document(dt) for dt in doc_types))
         else:
             await self.fetch_single_document(doc_type)
     
     async def fetch_single_document(self, doc_type: str):
         """Fetch a single document"""
         print(f"\n📂 Fetching {doc_type} data...")
-        
-        response = await self.system.a2a_protocol.send_message(
+        response = await self._request_document(doc_type)
+        self._record_document(doc_type, response)
+    
+    async def _request_document(self, doc_type: str) -> Dict[str, Any]:
+        """Ask the DataFetcher agent for a detailed analysis of one document"""
+        return await self.system.a2a_protocol.send_message(
             sender="interactive_underwriter",
             receiver="datafetcher",
             action="fetch_and_analyze",
@@ -152,28 +222,34 @@ class InteractiveLoanSession:
                 "analysis_type": "detailed"
             }
         )
-        
+    
+    def _record_document(self, doc_type: str, response: Dict[str, Any]):
+        """Store and display a fetch_and_analyze response"""
         if response["status"] == "success":
             self.fetched_documents[doc_type] = {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso(),
                 "data": response["summary"]
             }
+            self._touch()
             print(f"\n✅ {doc_type.upper()} Data Retrieved:")
-            print(response["summary"])
+            print(_preview(response["summary"]))
             
             self.conversation_history.append({
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso(),
                 "action": f"fetch_{doc_type}",
                 "result": response["summary"]
             })
         else:
             print(f"❌ Error fetching {doc_type}: {response.get('error')}")
     
-    async def search_information(self, command: str):
+    async def search_information(self, args: str):
         """Search for additional information"""
-        query = command.replace("search", "").strip()
+        query = args
+        # Allow a quoted name, e.g. search "Acme Corp"
+        if len(query) >= 2 and query[0] == query[-1] and query[0] in "\"'":
+            query = query[1:-1]
         if not query:
-            query = input("Enter search query: ")
+            query = await ainput("Enter search query: ")
         
         print(f"\n🔍 Searching for: {query}")
         
@@ -199,45 +275,37 @@ class InteractiveLoanSession:
                 print(results['ai_summary'])
             
             self.conversation_history.append({
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso(),
                 "action": "search",
                 "query": query,
                 "result": results
             })
     
-    async def ask_ai_question(self, command: str):
+    async def ask_ai_question(self, args: str):
         """Ask AI a specific question about the application"""
-        question = command.replace("question", "").strip()
+        question = args
         if not question:
-            question = input("Enter your question: ")
-        
-        llm = LLMProvider()
+            question = await ainput("Enter your question: ")
         
         # Prepare context
-        context = f"""
-        Application Details:
-        {json.dumps(self.application, indent=2)}
-        
-        Fetched Documents:
-        {json.dumps(self.fetched_documents, indent=2)}
-        
-        Previous Assessments:
-        {json.dumps(self.ai_assessments, indent=2)}
-        
+        context = f"""{self._question_context()}
         Question: {question}
         """
         
         print("\n🤔 Thinking...")
-        response = await llm.generate(
+        print(f"\n🤖 AI Response:")
+        parts = []
+        async for token in self.llm.stream(
             context,
             "You are an expert loan underwriter. Answer the question based on the provided context."
-        )
-        
-        print(f"\n🤖 AI Response:")
-        print(response)
+        ):
+            print(token, end="", flush=True)
+            parts.append(token)
+        print()
+        response = "".join(parts)
         
         self.conversation_history.append({
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "action": "ai_question",
             "question": question,
             "answer": response
@@ -262,7 +330,7 @@ class InteractiveLoanSession:
                 print(f"\n   📄 {doc_type.upper()}:")
                 print(f"   Fetched at: {doc_data['timestamp']}")
                 print("   " + "-"*20)
-                print(doc_data['data'])
+                print(_preview(doc_data['data']))
         else:
             print("   No documents fetched yet")
         
@@ -271,7 +339,7 @@ class InteractiveLoanSession:
         for assessment in self.ai_assessments:
             print(f"\n   🤖 {assessment['type']} ({assessment['timestamp']})")
             if isinstance(assessment['content'], dict):
-                print(f"   Analysis: {assessment['content'].get('analysis', 'N/A')}")
+                print(f"   Analysis: {_preview(assessment['content'].get('analysis', 'N/A'))}")
         
         print("\n4️⃣ ADDITIONAL NOTES:")
         print("-" * 40)
@@ -310,113 +378,111 @@ class InteractiveLoanSession:
         
         # Allow manual override
         print("\n📝 Manual Decision Override:")
-        override = input("Accept AI decision? (y/n/modify): ").lower()
+        override = (await ainput("Accept AI decision? (y/n/modify): ")).lower()
         
         if override == 'modify':
-            decision['decision'] = input("Enter decision (APPROVED/REJECTED/APPROVED_WITH_CONDITIONS): ")
-            decision['reasoning'] = input("Enter reasoning: ")
-            conditions = input("Enter conditions (comma-separated): ")
+            decision['decision'] = await ainput("Enter decision (APPROVED/REJECTED/APPROVED_WITH_CONDITIONS): ")
+            decision['reasoning'] = await ainput("Enter reasoning: ")
+            conditions = await ainput("Enter conditions (comma-separated): ")
             decision['conditions'] = [c.strip() for c in conditions.split(',')] if conditions else []
         
         self.current_decision = decision
         print("\n✅ Decision recorded")
     
-    def add_note(self, command: str):
+    async def add_note(self, args: str):
         """Add a note to the case"""
-        note_text = command.replace("note", "").strip()
+        note_text = args
         if not note_text:
-            note_text = input("Enter note: ")
+            note_text = await ainput("Enter note: ")
         
         self.additional_notes.append({
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "text": note_text
         })
         print("✅ Note added")
     
-    async def generate_report(self):
-        """Generate comprehensive report"""
-        print("\n" + "="*60)
-        print("📋 COMPREHENSIVE LOAN UNDERWRITING REPORT")
-        print("="*60)
-        print(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Session ID: {self.session_id}")
-        print("="*60)
+    async def generate_report(self, out=print):
+        """Generate comprehensive report and emit it through `out` in a single call"""
+        lines = []
+        emit = lines.append
+        emit("\n" + "="*60)
+        emit("📋 COMPREHENSIVE LOAN UNDERWRITING REPORT")
+        emit("="*60)
+        emit(f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        emit(f"Session ID: {self.session_id}")
+        emit("="*60)
         
         # Executive Summary
-        print("\n📊 EXECUTIVE SUMMARY")
-        print("-" * 40)
-        print(f"Applicant: {self.application['applicant_name']}")
-        print(f"Loan Amount: ₹{self.application['loan_amount']:,.2f}")
-        print(f"Business Type: {self.application['business_type']}")
-        print(f"Purpose: {self.application['loan_purpose']}")
+        emit("\n📊 EXECUTIVE SUMMARY")
+        emit("-" * 40)
+        emit(f"Applicant: {self.application['applicant_name']}")
+        emit(f"Loan Amount: ₹{self.application['loan_amount']:,.2f}")
+        emit(f"Business Type: {self.application['business_type']}")
+        emit(f"Purpose: {self.application['loan_purpose']}")
         
         if self.current_decision:
-            print(f"\nFinal Decision: {self.current_decision['decision']}")
-            print(f"Risk Score: {self.current_decision.get('risk_score', 'N/A')}/100")
+            emit(f"\nFinal Decision: {self.current_decision['decision']}")
+            emit(f"Risk Score: {self.current_decision.get('risk_score', 'N/A')}/100")
         else:
-            print("\nFinal Decision: PENDING")
+            emit("\nFinal Decision: PENDING")
         
         # Detailed Analysis
-        print("\n📈 DETAILED ANALYSIS")
-        print("-" * 40)
+        emit("\n📈 DETAILED ANALYSIS")
+        emit("-" * 40)
         
         # AI Assessments
-        print("\n1. AI Assessments:")
+        emit("\n1. AI Assessments:")
         for i, assessment in enumerate(self.ai_assessments, 1):
-            print(f"\n   Assessment {i} ({assessment['timestamp']}):")
+            emit(f"\n   Assessment {i} ({assessment['timestamp']}):")
             if isinstance(assessment['content'], dict):
-                print(f"   {assessment['content'].get('analysis', 'N/A')}")
+                emit(f"   {assessment['content'].get('analysis', 'N/A')}")
         
         # Financial Documents Summary
-        print("\n2. Financial Documents Analysis:")
+        emit("\n2. Financial Documents Analysis:")
         if self.fetched_documents:
             for doc_type, doc_data in self.fetched_documents.items():
-                print(f"\n   {doc_type.upper()}:")
-                print(f"   {doc_data['data'][:500]}...")  # First 500 chars
+                emit(f"\n   {doc_type.upper()}:")
+                emit(f"   {doc_data['data'][:500]}...")  # First 500 chars
         else:
-            print("   No documents analyzed")
+            emit("   No documents analyzed")
         
         # Decision Rationale
         if self.current_decision:
-            print("\n3. Decision Rationale:")
-            print(f"   {self.current_decision.get('reasoning', 'No reasoning provided')}")
+            emit("\n3. Decision Rationale:")
+            emit(f"   {self.current_decision.get('reasoning', 'No reasoning provided')}")
             if self.current_decision.get('conditions'):
-                print("\n4. Conditions:")
+                emit("\n4. Conditions:")
                 for condition in self.current_decision['conditions']:
-                    print(f"   • {condition}")
+                    emit(f"   • {condition}")
         
         # Additional Notes
         if self.additional_notes:
-            print("\n5. Underwriter Notes:")
+            emit("\n5. Underwriter Notes:")
             for note in self.additional_notes:
-                print(f"   • {note['timestamp']}: {note['text']}")
+                emit(f"   • {note['timestamp']}: {note['text']}")
         
         # Risk Factors
-        print("\n6. Key Risk Factors:")
-        print("   • Debt-to-Income Ratio")
-        print("   • Business Stability")
-        print("   • Tax Compliance")
-        print("   • Credit History")
+        emit("\n6. Key Risk Factors:")
+        emit("   • Debt-to-Income Ratio")
+        emit("   • Business Stability")
+        emit("   • Tax Compliance")
+        emit("   • Credit History")
         
-        print("\n" + "="*60)
-        print("END OF REPORT")
-        print("="*60)
+        emit("\n" + "="*60)
+        emit("END OF REPORT")
+        emit("="*60)
+        
+        out("\n".join(lines))
     
     async def export_report(self):
         """Export report to file"""
         filename = f"loan_report_{self.application['applicant_name'].replace(' ', '_')}_{self.session_id}.txt"
         
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                # Redirect print to file
-                import sys
-                original_stdout = sys.stdout
-                sys.stdout = f
-                
-                await self.generate_report()
-                
-                # Restore stdout
-                sys.stdout = original_stdout
+            report = []
+            await self.generate_report(out=report.append)
+            # Disk writes run in a worker thread so the event loop keeps serving
+            await asyncio.to_thread(Path(filename).write_text, "\n".join(report) + "\n", encoding='utf-8')
             
             print(f"\n✅ Report exported to: {filename}")
             
@@ -426,14 +492,16 @@ class InteractiveLoanSession:
                 "session_id": self.session_id,
                 "application": self.application,
                 "fetched_documents": self.fetched_documents,
-                "ai_assessments": self.ai_assessments,
+                "ai_assessments": list(self.ai_assessments),
                 "additional_notes": self.additional_notes,
                 "current_decision": self.current_decision,
-                "conversation_history": self.conversation_history
+                "conversation_history": list(self.conversation_history)
             }
             
-            with open(json_filename, 'w', encoding='utf-8') as f:
-                json.dump(report_data, f, indent=2)
+            await asyncio.to_thread(
+                Path(json_filename).write_bytes,
+                orjson.dumps(report_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            )
             
             print(f"✅ Data exported to: {json_filename}")
             
@@ -449,7 +517,8 @@ class InteractiveLoanSession:
             print("No conversation history yet")
             return
         
-        for entry in self.conversation_history[-10:]:  # Last 10 entries
+        start = max(0, len(self.conversation_history) - 10)
+        for entry in islice(self.conversation_history, start, None):  # Last 10 entries
             print(f"\n📅 {entry['timestamp']}")
             print(f"   Action: {entry['action']}")
             if 'query' in entry:
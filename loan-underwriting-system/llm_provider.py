@@ -1,17 +1,27 @@
 import os
+import asyncio
+import functools
+import hashlib
 from typing import Dict, Any, List
 from dotenv import load_dotenv
+from cachetools import LRUCache
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.llms import Ollama
 from langchain.schema import HumanMessage, SystemMessage
-import json
+import orjson
 
 load_dotenv()
 
 class LLMProvider:
     def __init__(self):
         self.provider = os.getenv("LLM_PROVIDER", "gemini").strip().lower()
+        self.temperature = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+        # Responses are reused when sampling is deterministic (temperature 0)
+        # or when the caller opts in, as analyze_json does for identical data
+        self._cache = LRUCache(maxsize=128)
+        # Caps in-flight requests so concurrent fan-out stays within provider rate limits
+        self._semaphore = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
         
         if self.provider == "gemini":
             api_key = os.getenv("GOOGLE_API_KEY")
@@ -22,46 +32,96 @@ class LLMProvider:
             # Use the new Gemini model names
             self.llm = ChatGoogleGenerativeAI(
                 model="gemini-1.5-flash",  
-                temperature=0.7,
-                google_api_key=api_key,
-                convert_system_message_to_human=True  
+                temperature=self.temperature,
+                google_api_key=api_key
             )
         elif self.provider == "ollama":
             self.llm = Ollama(
                 base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-                model=os.getenv("OLLAMA_MODEL", "gemma3:12b")
+                model=os.getenv("OLLAMA_MODEL", "gemma3:12b"),
+                temperature=self.temperature
             )
         else:
             raise ValueError(f"Unknown LLM provider: {self.provider}")
     
-    async def generate(self, prompt: str, system_prompt: str = None) -> str:
+    async def generate(self, prompt: str, system_prompt: str = None, cache: bool = False) -> str:
         """Generate response from LLM"""
+        key = self._cache_key(prompt, system_prompt) if cache or self.temperature == 0 else None
+        if key is not None and key in self._cache:
+            return self._cache[key]
+        
         try:
+            async with self._semaphore:
+                response = await self.llm.ainvoke(self._build_input(prompt, system_prompt))
             if self.provider == "gemini":
-                # Combine system prompt with user prompt for Gemini
-                if system_prompt:
-                    full_prompt = f"{system_prompt}\n\n{prompt}"
-                else:
-                    full_prompt = prompt
-                
-                messages = [HumanMessage(content=full_prompt)]
-                response = await self.llm.ainvoke(messages)
-                return response.content
-            else:
-                # For Ollama
-                if system_prompt:
-                    prompt = f"{system_prompt}\n\n{prompt}"
-                response = await self.llm.ainvoke(prompt)
-                return response
+                response = response.content
+        except Exception as e:
+            print(f"LLM Error: {str(e)}")
+            # Provide a fallback response (never cached)
+            return self._get_fallback_response(self._fallback_prompt(prompt, system_prompt), str(e))
+        
+        if key is not None:
+            self._cache[key] = response
+        return response
+    
+    async def stream(self, prompt: str, system_prompt: str = None):
+        """Yield the response in chunks as the LLM produces them"""
+        # Shares the deterministic-response cache with generate; a hit is yielded whole
+        key = self._cache_key(prompt, system_prompt) if self.temperature == 0 else None
+        if key is not None and key in self._cache:
+            yield self._cache[key]
+            return
+        
+        parts = []
+        try:
+            async with self._semaphore:
+                async for chunk in self.llm.astream(self._build_input(prompt, system_prompt)):
+                    # Chat models yield message chunks, Ollama yields plain strings
+                    text = chunk.content if self.provider == "gemini" else chunk
+                    parts.append(text)
+                    yield text
         except Exception as e:
             print(f"LLM Error: {str(e)}")
-            # Provide a fallback response
-            return self._get_fallback_response(prompt, str(e))
+            yield self._get_fallback_response(self._fallback_prompt(prompt, system_prompt), str(e))
+            return
+        
+        if key is not None:
+            self._cache[key] = "".join(parts)
     
-    async def analyze_json(self, data: Dict, analysis_prompt: str) -> str:
-        """Analyze JSON data with LLM"""
-        prompt = f"{analysis_prompt}\n\nData:\n{json.dumps(data, indent=2)}"
-        return await self.generate(prompt)
+    def _join_prompt(self, prompt: str, system_prompt: str = None) -> str:
+        """Combine system prompt with user prompt"""
+        return f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+    
+    def _fallback_prompt(self, prompt: str, system_prompt: str = None) -> str:
+        """Text the fallback keyword match runs on: the user prompt for Gemini, the combined prompt for Ollama"""
+        return prompt if self.provider == "gemini" else self._join_prompt(prompt, system_prompt)
+    
+    def _build_input(self, prompt: str, system_prompt: str = None):
+        """Build the provider-specific model input"""
+        if self.provider == "gemini":
+            # Gemini takes the system prompt as a native system instruction
+            messages = [SystemMessage(content=system_prompt)] if system_prompt else []
+            messages.append(HumanMessage(content=prompt))
+            return messages
+        # Ollama is a completion model and takes the combined string
+        return self._join_prompt(prompt, system_prompt)
+    
+    def _cache_key(self, prompt: str, system_prompt: str = None) -> str:
+        """Hash of everything that determines a deterministic response"""
+        h = hashlib.blake2b(digest_size=16)
+        for part in (self.provider, str(self.temperature), system_prompt or "", prompt):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+    
+    def clear_cache(self):
+        """Drop all cached responses"""
+        self._cache.clear()
+    
+    async def analyze_json(self, data: Dict, analysis_prompt: str, system_prompt: str = None) -> str:
+        """Analyze JSON data with LLM, memoized on the serialized data and prompts"""
+        prompt = f"{analysis_prompt}\n\nData:\n{orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()}"
+        return await self.generate(prompt, system_prompt, cache=True)
     
     def _get_fallback_response(self, prompt: str, error: str) -> str:
         """Provide fallback response when LLM fails"""
@@ -83,4 +143,9 @@ Manual review required. Please evaluate:
 - Credit history"""
         
         else:
-            return f"Analysis unavailable due to error: {error}. Manual review required."
\ No newline at end of file
+            return f"Analysis unavailable due to error: {error}. Manual review required."
+
+@functools.lru_cache(maxsize=1)
+def get_llm() -> LLMProvider:
+    """Return the process-wide LLMProvider, constructing it on first use"""
+    return LLMProvider()
\ No newline at end of file
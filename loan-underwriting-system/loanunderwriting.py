@@ -1,43 +1,87 @@
 import asyncio
-import subprocess
+import logging
 import sys
 import os
-from datetime import datetime
+from collections import deque
+from itertools import islice
 from dotenv import load_dotenv
 
 # Import required modules
-from a2a_protocol import A2AProtocol
+from a2a_protocol import A2AProtocol, now_iso, MCP_READY_SENTINEL
 from agents.datafetcher import handle_a2a_message as datafetcher_handler, register_a2a as register_datafetcher_a2a
 from agents.underwriter import handle_a2a_message as underwriter_handler, register_a2a as register_underwriter_a2a
 from interactivelsession import InteractiveLoanSession
+from console import ainput
+from server.datafetchertool import close_http_client
+from server.underwritertool import HISTORY_MAX
 
 load_dotenv()
 
+MCP_START_TIMEOUT = 10.0
+MCP_STOP_TIMEOUT = 5.0
+# Agent servers are run as modules from here so their top-level imports resolve
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+logger = logging.getLogger("loan")
+
+
+async def _drain(stream: asyncio.StreamReader, source: str):
+    """Consume a child pipe so the server never blocks on a full pipe buffer"""
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        logger.debug("[%s] %s", source, line.decode(errors="replace").rstrip())
+
+
+async def _wait_for_ready(stream: asyncio.StreamReader, source: str, output: list) -> bool:
+    """Read lines until the ready sentinel appears; False if the stream closes first.
+
+    Lines seen before the sentinel are logged and collected in output so a
+    failed startup can be reported with the server's own error.
+    """
+    while True:
+        line = await stream.readline()
+        if not line:
+            return False
+        text = line.decode(errors="replace").rstrip()
+        if text.strip() == MCP_READY_SENTINEL:
+            return True
+        logger.debug("[%s] %s", source, text)
+        output.append(text)
+
 
 class LoanUnderwritingSystem:
     def __init__(self):
         self.a2a_protocol = A2AProtocol()
         self.datafetcher_process = None
         self.underwriter_process = None
+        self._drain_tasks = []
         self.is_running = False
-        self.sessions_history = []
+        self.sessions_history = deque(maxlen=HISTORY_MAX)
+        # Main menu command -> handler; "exit" is handled by the loop itself
+        self._commands = {
+            "new": self.process_loan_application,
+            "history": self.view_sessions_history,
+            "data": self.view_available_data,
+            "help": self._show_help
+        }
         
     async def start_system(self):
         """Initialize and start the loan underwriting system"""
-        print("🚀 Starting AI-Powered Loan Underwriting System...")
-        print("=" * 60)
+        lines = ["🚀 Starting AI-Powered Loan Underwriting System...", "=" * 60]
         
         # Check LLM configuration
         llm_provider = os.getenv("LLM_PROVIDER", "gemini")
-        print(f"🤖 LLM Provider: {llm_provider}")
+        lines.append(f"🤖 LLM Provider: {llm_provider}")
         
         if llm_provider == "gemini" and not os.getenv("GOOGLE_API_KEY"):
-            print("⚠️  Warning: GOOGLE_API_KEY not set in .env file")
+            lines.append("⚠️  Warning: GOOGLE_API_KEY not set in .env file")
         elif llm_provider == "ollama":
-            print(f"🔗 Ollama URL: {os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')}")
-            print(f"📦 Ollama Model: {os.getenv('OLLAMA_MODEL', 'llama2')}")
+            lines.append(f"🔗 Ollama URL: {os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')}")
+            lines.append(f"📦 Ollama Model: {os.getenv('OLLAMA_MODEL', 'llama2')}")
         
-        print("-" * 60)
+        lines.append("-" * 60)
+        print("\n".join(lines))
         
         # Register A2A handlers
         self.a2a_protocol.register_agent("datafetcher", datafetcher_handler)
@@ -50,70 +94,108 @@ class LoanUnderwritingSystem:
         # Start MCP servers in separate processes
         print("\n📦 Starting MCP Servers...")
         
-        # Start DataFetcher MCP server
-        self.datafetcher_process = subprocess.Popen(
-            [sys.executable, "agents/datafetcher.py"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        # Start both servers and wait for each to report ready
+        datafetcher, underwriter = await asyncio.gather(
+            self._start_mcp_server("agents.datafetcher", "DataFetcher"),
+            self._start_mcp_server("agents.underwriter", "Underwriter")
         )
-        print("✅ DataFetcher MCP Server started")
+        self.datafetcher_process, datafetcher_ready = datafetcher
+        self.underwriter_process, underwriter_ready = underwriter
         
-        # Start Underwriter MCP server
-        self.underwriter_process = subprocess.Popen(
-            [sys.executable, "agents/underwriter.py"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        # A2A agents run in-process, so the system stays usable without the MCP servers
+        self.is_running = True
+        if datafetcher_ready and underwriter_ready:
+            print("\n✅ System Ready!\n" + "=" * 60)
+        else:
+            print("\n⚠️  System started, but not all MCP Servers are running\n" + "=" * 60)
+    
+    async def _start_mcp_server(self, module: str, name: str):
+        """Launch an MCP server module and wait until it signals readiness.
+
+        Returns the process and whether it reported ready.
+        """
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", module,
+            cwd=PROJECT_ROOT,
+            # The stdio transport serves on stdin; give it a pipe so it does not read the console
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
-        print("✅ Underwriter MCP Server started")
-        
-        # Give servers time to start
-        await asyncio.sleep(2)
+        output = []
+        ready = False
+        try:
+            ready = await asyncio.wait_for(
+                _wait_for_ready(process.stderr, f"{name} stderr", output), MCP_START_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️  {name} MCP Server did not report ready within {MCP_START_TIMEOUT:.0f}s")
+        else:
+            if ready:
+                print(f"✅ {name} MCP Server started")
+            else:
+                print(f"❌ {name} MCP Server exited during startup")
+        if not ready and output:
+            print("\n".join(f"   {line}" for line in output))
         
-        self.is_running = True
-        print("\n✅ System Ready!")
-        print("=" * 60)
+        self._drain_tasks.extend([
+            asyncio.create_task(_drain(process.stdout, f"{name} stdout")),
+            asyncio.create_task(_drain(process.stderr, f"{name} stderr"))
+        ])
+        return process, ready
     
-    def stop_system(self):
+    async def stop_system(self):
         """Stop all MCP servers"""
         print("\n🛑 Stopping MCP Servers...")
-        if self.datafetcher_process:
-            self.datafetcher_process.terminate()
-        if self.underwriter_process:
-            self.underwriter_process.terminate()
+        for process in (self.datafetcher_process, self.underwriter_process):
+            if process and process.returncode is None:
+                try:
+                    process.terminate()
+                    try:
+                        await asyncio.wait_for(process.wait(), MCP_STOP_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        # Server ignored SIGTERM; don't let it hang shutdown
+                        process.kill()
+                        await process.wait()
+                except ProcessLookupError:
+                    pass  # already exited
+        for task in self._drain_tasks:
+            task.cancel()
+        self._drain_tasks.clear()
+        await close_http_client()
         self.is_running = False
         print("✅ All servers stopped")
     
     async def process_loan_application(self):
         """Process a new loan application with interactive session"""
-        print("\n" + "="*60)
-        print("📝 NEW LOAN APPLICATION")
-        print("="*60)
+        print("\n" + "="*60 + "\n📝 NEW LOAN APPLICATION\n" + "="*60)
         
         try:
             # Collect application details
             print("\nPlease enter the application details:")
-            applicant_name = input("Applicant Name: ").strip()
+            applicant_name = (await ainput("Applicant Name: ")).strip()
             
             while True:
                 try:
-                    loan_amount = float(input("Loan Amount (₹): ").replace(",", ""))
+                    loan_amount = float((await ainput("Loan Amount (₹): ")).replace(",", ""))
                     break
                 except ValueError:
                     print("❌ Please enter a valid number")
             
-            business_type = input("Business Type: ").strip()
-            loan_purpose = input("Loan Purpose: ").strip()
+            business_type = (await ainput("Business Type: ")).strip()
+            loan_purpose = (await ainput("Loan Purpose: ")).strip()
             
             while True:
                 try:
-                    years_in_business = int(input("Years in Business: "))
+                    years_in_business = int(await ainput("Years in Business: "))
                     break
                 except ValueError:
                     print("❌ Please enter a valid number")
             
-            additional_info = input("Additional Information (optional): ").strip()
+            additional_info = (await ainput("Additional Information (optional): ")).strip()
             
-            # Create application object
+            # Create application object; one timestamp covers the application and its history entry
+            timestamp = now_iso()
             application = {
                 "applicant_name": applicant_name,
                 "loan_amount": loan_amount,
@@ -121,7 +203,7 @@ class LoanUnderwritingSystem:
                 "loan_purpose": loan_purpose,
                 "years_in_business": years_in_business,
                 "additional_info": additional_info,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": timestamp
             }
             
             # Start interactive session
@@ -133,7 +215,7 @@ class LoanUnderwritingSystem:
                 "session_id": session.session_id,
                 "application": application,
                 "decision": decision,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": timestamp
             })
             
         except KeyboardInterrupt:
@@ -143,25 +225,25 @@ class LoanUnderwritingSystem:
     
     async def view_sessions_history(self):
         """View history of all loan sessions"""
-        print("\n📊 LOAN SESSIONS HISTORY")
-        print("-" * 40)
+        lines = ["\n📊 LOAN SESSIONS HISTORY", "-" * 40]
         
         if not self.sessions_history:
-            print("No sessions in history")
-            return
+            lines.append("No sessions in history")
         
-        for session in self.sessions_history[-10:]:  # Last 10 sessions
-            print(f"\n📅 Session: {session['session_id']}")
-            print(f"   Applicant: {session['application']['applicant_name']}")
-            print(f"   Amount: ₹{session['application']['loan_amount']:,.2f}")
+        start = max(0, len(self.sessions_history) - 10)
+        for session in islice(self.sessions_history, start, None):  # Last 10 sessions
+            lines.append(f"\n📅 Session: {session['session_id']}")
+            lines.append(f"   Applicant: {session['application']['applicant_name']}")
+            lines.append(f"   Amount: ₹{session['application']['loan_amount']:,.2f}")
             if session['decision']:
-                print(f"   Decision: {session['decision'].get('decision', 'PENDING')}")
-            print(f"   Date: {session['timestamp']}")
+                lines.append(f"   Decision: {session['decision'].get('decision', 'PENDING')}")
+            lines.append(f"   Date: {session['timestamp']}")
+        
+        print("\n".join(lines))
     
     async def view_available_data(self):
         """View available data files"""
-        print("\n📁 CHECKING AVAILABLE DATA")
-        print("-" * 40)
+        print("\n📁 CHECKING AVAILABLE DATA\n" + "-" * 40)
         
         response = await self.a2a_protocol.send_message(
             sender="main_viewer",
@@ -172,40 +254,41 @@ class LoanUnderwritingSystem:
         
         if response["status"] == "success":
             available = response["available_data_types"]
-            print(f"\n📂 Available Data Files:")
-            for data_type in available:
-                print(f"   ✓ {data_type}.json")
+            lines = ["\n📂 Available Data Files:"]
+            lines.extend(f"   ✓ {data_type}.json" for data_type in available)
+            print("\n".join(lines))
         else:
             print(f"❌ Error: {response.get('error', 'Unknown error')}")
     
+    async def _show_help(self):
+        """Show the short command list"""
+        print("\nCommands: new, history, data, help, exit")
+    
     async def run_interactive_session(self):
         """Run the main interactive session"""
-        print("\n💬 INTERACTIVE LOAN UNDERWRITING SYSTEM")
-        print("=" * 60)
-        print("Commands:")
-        print("  new      - Process new loan application")
-        print("  history  - View sessions history")
-        print("  data     - View available data files")
-        print("  help     - Show this help")
-        print("  exit     - Exit the system")
-        print("=" * 60)
+        print("\n".join([
+            "\n💬 INTERACTIVE LOAN UNDERWRITING SYSTEM",
+            "=" * 60,
+            "Commands:",
+            "  new      - Process new loan application",
+            "  history  - View sessions history",
+            "  data     - View available data files",
+            "  help     - Show this help",
+            "  exit     - Exit the system",
+            "=" * 60
+        ]))
         
         while self.is_running:
             try:
-                command = input("\n[Main]> ").strip().lower()
+                command = (await ainput("\n[Main]> ")).strip().lower()
                 
-                if command == "exit":
-                    confirm = input("Exit system? (y/n): ").lower()
+                handler = self._commands.get(command)
+                if handler is not None:
+                    await handler()
+                elif command == "exit":
+                    confirm = (await ainput("Exit system? (y/n): ")).lower()
                     if confirm == 'y':
                         break
-                elif command == "new":
-                    await self.process_loan_application()
-                elif command == "history":
-                    await self.view_sessions_history()
-                elif command == "data":
-                    await self.view_available_data()
-                elif command == "help":
-                    print("\nCommands: new, history, data, help, exit")
                 else:
                     print("❌ Unknown command. Type 'help' for available commands.")
                     
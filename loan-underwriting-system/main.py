@@ -2,6 +2,11 @@ from loanunderwriting import LoanUnderwritingSystem
 import asyncio
 import os
 
+try:
+    import uvloop
+except ImportError:  # not available on Windows; fall back to the stdlib loop
+    uvloop = None
+
 async def main():
     """Main entry point"""
     system = LoanUnderwritingSystem()
@@ -29,7 +34,10 @@ async def main():
         
     finally:
         # Clean up
-        system.stop_system()
+        await system.stop_system()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file
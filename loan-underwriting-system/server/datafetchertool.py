@@ -1,21 +1,66 @@
 from fastmcp import FastMCP
+import asyncio
 import os
 import json
-from typing import Dict, Any, List
-from llm_provider import LLMProvider
+import orjson
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Final
+from llm_provider import get_llm
 import httpx
 
 # Init
 data_directory = "./data"
-llm = LLMProvider()
+llm = get_llm()
 mcp = FastMCP("DataFetcher Agent")
 
+# Fixed prompts are built once at import time
+_FINANCIAL_ANALYST_SYSTEM_PROMPT: Final[str] = """You are a financial analyst AI. Analyze the provided financial data and provide:
+    1. Key insights
+    2. Risk indicators
+    3. Financial health score (0-100)
+    4. Recommendations"""
+
+_COMPREHENSIVE_PROMPT: Final[str] = """Based on all the financial data provided, give a comprehensive 
+        loan underwriting assessment including:
+        1. Overall financial health
+        2. Combined risk assessment
+        3. Loan approval recommendation
+        4. Any red flags or concerns"""
+
+_http_client: Optional[httpx.AsyncClient] = None
+# file path -> (st_mtime_ns, parsed data); a file is re-read only after it changes
+_json_cache: Dict[str, Tuple[int, Any]] = {}
+# directory -> (st_mtime_ns, data types found in it)
+_listing_cache: Dict[str, Tuple[int, List[str]]] = {}
+
+def _get_client() -> httpx.AsyncClient:
+    """Shared HTTP client so connections are pooled and kept alive across searches"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared HTTP client, if one was created"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 # 🔧 Core utility functions (can be reused anywhere)
 async def fetch_data_core(data_type: str) -> Dict[str, Any]:
     file_path = os.path.join(data_directory, f"{data_type}.json")
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+        mtime_ns = (await asyncio.to_thread(os.stat, file_path)).st_mtime_ns
+        cached = _json_cache.get(file_path)
+        if cached is not None and cached[0] == mtime_ns:
+            data = cached[1]
+        else:
+            data = orjson.loads(await asyncio.to_thread(Path(file_path).read_bytes))
+            _json_cache[file_path] = (mtime_ns, data)
         return {
             "status": "success",
             "data_type": data_type,
@@ -44,36 +89,30 @@ async def analyze_financial_data_core(data_type: str) -> str:
         return f"Error: {result['message']}"
 
 async def analyze_financial_health_core(data: Dict[str, Any], data_type: str) -> str:
-    system_prompt = """You are a financial analyst AI. Analyze the provided financial data and provide:
-    1. Key insights
-    2. Risk indicators
-    3. Financial health score (0-100)
-    4. Recommendations"""
     analysis_prompt = f"""Analyze this {data_type.upper()} data for loan underwriting purposes. 
     Focus on creditworthiness, financial stability, and risk factors."""
-    return await llm.analyze_json(data, analysis_prompt)
+    return await llm.analyze_json(data, analysis_prompt, _FINANCIAL_ANALYST_SYSTEM_PROMPT)
 
 async def intelligent_summarize_core(data_types: List[str]) -> str:
-    all_data = {}
-    summaries = []
-
-    for data_type in data_types:
+    async def _fetch_and_analyze(data_type: str):
         result = await fetch_data_core(data_type)
         if result["status"] == "success":
-            all_data[data_type] = result["data"]
             analysis = await analyze_financial_health_core(result["data"], data_type)
-            summaries.append(f"📊 {data_type.upper()} Analysis:\n{analysis}")
-        else:
-            summaries.append(f"❌ {data_type.upper()}: {result['message']}")
+            return data_type, result["data"], f"📊 {data_type.upper()} Analysis:\n{analysis}"
+        return data_type, None, f"❌ {data_type.upper()}: {result['message']}"
+
+    # Per-document analyses are independent LLM calls; run them together
+    results = await asyncio.gather(*(_fetch_and_analyze(dt) for dt in data_types))
+
+    all_data = {}
+    summaries = []
+    for data_type, data, summary in results:
+        if data is not None:
+            all_data[data_type] = data
+        summaries.append(summary)
 
     if len(all_data) > 1:
-        comprehensive_prompt = """Based on all the financial data provided, give a comprehensive 
-        loan underwriting assessment including:
-        1. Overall financial health
-        2. Combined risk assessment
-        3. Loan approval recommendation
-        4. Any red flags or concerns"""
-        comprehensive_analysis = await llm.analyze_json(all_data, comprehensive_prompt)
+        comprehensive_analysis = await llm.analyze_json(all_data, _COMPREHENSIVE_PROMPT)
         summaries.append(f"\n🎯 COMPREHENSIVE ASSESSMENT:\n{comprehensive_analysis}")
 
     return "\n\n".join(summaries)
@@ -93,27 +132,30 @@ async def search_business_info_core(business_name: str, search_type: str = "gene
     search_query = f"{business_name} {query_suffix}"
     
     try:
-        async with httpx.AsyncClient() as client:
-            # DuckDuckGo instant answer API
-            response = await client.get(
+        client = _get_client()
+        # DuckDuckGo instant answer API and web search, issued concurrently
+        response, web_response = await asyncio.gather(
+            client.get(
                 "https://api.duckduckgo.com/",
                 params={
                     "q": search_query,
                     "format": "json",
                     "no_html": "1",
                     "skip_disambig": "1"
-                },
-                timeout=10.0
-            )
-            data = response.json()
-            
-            # Also try to get web search results
-            web_response = await client.get(
+                }
+            ),
+            client.get(
                 "https://html.duckduckgo.com/html/",
                 params={"q": search_query},
-                headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"},
-                timeout=10.0
-            )
+                headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+            ),
+            return_exceptions=True
+        )
+        
+        # The instant answer drives the results; a failed web search is not fatal
+        if isinstance(response, BaseException):
+            raise response
+        data = response.json()
         
         search_results = {
             "business_name": business_name,
@@ -181,8 +223,11 @@ async def search_business_info_core(business_name: str, search_type: str = "gene
                 "source": "System Note"
             })
         
-        # Get AI summary of search results
-        if search_results["results"]:
+        # Get AI summary of search results, unless there is nothing beyond the system note to analyze
+        results = search_results["results"]
+        if len(results) < 2 or all(r["source"] == "System Note" for r in results):
+            search_results["ai_summary"] = f"Insufficient data for {business_name}; recommend manual verification."
+        else:
             ai_summary = await llm.analyze_json(
                 search_results,
                 f"""Analyze these search results for {business_name} and provide:
@@ -193,8 +238,6 @@ async def search_business_info_core(business_name: str, search_type: str = "gene
                 Focus on {search_type} aspects."""
             )
             search_results["ai_summary"] = ai_summary
-        else:
-            search_results["ai_summary"] = f"No substantial search results found for {business_name}. This could indicate a very new business, a small local business, or the need for more specific search terms."
         
         return search_results
         
@@ -216,8 +259,18 @@ async def search_business_info_core(business_name: str, search_type: str = "gene
         }
 
 def list_available_data_core() -> List[str]:
-    files = os.listdir(data_directory) if os.path.exists(data_directory) else []
-    return [f.replace('.json', '') for f in files if f.endswith('.json')]
+    try:
+        mtime_ns = os.stat(data_directory).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    # Adding or removing a file bumps the directory mtime and invalidates the listing
+    cached = _listing_cache.get(data_directory)
+    if cached is not None and cached[0] == mtime_ns:
+        return list(cached[1])
+    with os.scandir(data_directory) as entries:
+        names = [e.name[:-5] for e in entries if e.name.endswith('.json') and e.is_file()]
+    _listing_cache[data_directory] = (mtime_ns, names)
+    return list(names)
 
 # ✅ MCP Tools using core logic
 @mcp.tool()
@@ -252,5 +305,6 @@ __all__ = [
     "analyze_financial_data_core", 
     "intelligent_summarize_core",
     "search_business_info_core",
-    "list_available_data_core"
+    "list_available_data_core",
+    "close_http_client"
 ]
\ No newline at end of file
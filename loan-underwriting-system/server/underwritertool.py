@@ -1,19 +1,37 @@
 # agents/tool_underwriter.py
 
 from fastmcp import FastMCP
-import json
-from typing import Dict, Any, List
-from datetime import datetime
-from llm_provider import LLMProvider
-from a2a_protocol import A2AMessage
+import os
+import orjson
+from collections import deque
+from itertools import islice
+from typing import Dict, Any, List, Optional, Final
+from llm_provider import get_llm
+from a2a_protocol import A2AMessage, now_iso
 
 mcp = FastMCP("Underwriter Agent")
-llm = LLMProvider()
+llm = get_llm()
+# Cap on loan sessions and decisions kept in memory; shared with the agents and main system
+HISTORY_MAX = int(os.getenv("HISTORY_MAX", "1024"))
+
+# System prompts are fixed, so they are built once and sent as the system instruction
+_UNDERWRITER_SYSTEM_PROMPT: Final[str] = """You are an expert loan underwriter AI. Analyze loan applications and determine:
+    1. What financial documents are needed
+    2. Risk assessment criteria
+    3. Key factors to investigate
+    """
+
+_DECISION_SYSTEM_PROMPT: Final[str] = """You are a senior loan underwriter making final decisions. Based on the application and financial data:
+    1. Calculate a risk score (0-100, where 100 is lowest risk)
+    2. Make a decision: APPROVED, APPROVED_WITH_CONDITIONS, or REJECTED
+    3. Provide clear reasoning
+    4. List any conditions
+    Format your response as JSON"""
 
 # External state references (set via register_tool_state)
 a2a_protocol = None
 current_application = None
-decision_history = []
+decision_history = deque(maxlen=HISTORY_MAX)
 
 def register_tool_state(protocol, current_app_ref, history_ref):
     global a2a_protocol, current_application, decision_history
@@ -22,12 +40,17 @@ def register_tool_state(protocol, current_app_ref, history_ref):
     decision_history = history_ref
 
 
+# Deterministic document rules checked before the LLM: (label, predicate, required documents)
+_DOCUMENT_RULES = [
+    ("ITR only", lambda app: app.get('loan_amount', 0) < 500000 and app.get('years_in_business', 0) >= 2, ["itr"]),
+]
+
+
 async def llm_analyze_application(application: Dict[str, Any]) -> Dict[str, Any]:
-    system_prompt = """You are an expert loan underwriter AI. Analyze loan applications and determine:
-    1. What financial documents are needed
-    2. Risk assessment criteria
-    3. Key factors to investigate
-    """
+    # Common cases are settled by rule; only ambiguous applications go to the LLM
+    for label, matches, docs in _DOCUMENT_RULES:
+        if matches(application):
+            return {"analysis": f"auto-rule: {label}", "required_documents": list(docs)}
 
     prompt = f"""Analyze this loan application:
     - Applicant: {application.get('applicant_name')}
@@ -36,7 +59,7 @@ async def llm_analyze_application(application: Dict[str, Any]) -> Dict[str, Any]
     - Purpose: {application.get('loan_purpose')}
     - Years in Business: {application.get('years_in_business', 0)}"""
 
-    analysis = await llm.generate(prompt, system_prompt)
+    analysis = await llm.generate(prompt, _UNDERWRITER_SYSTEM_PROMPT)
     required_docs = []
     if "gst" in analysis.lower(): required_docs.append("gst")
     if "itr" in analysis.lower() or "income tax" in analysis.lower(): required_docs.append("itr")
@@ -49,22 +72,41 @@ async def llm_analyze_application(application: Dict[str, Any]) -> Dict[str, Any]
     return {"analysis": analysis, "required_documents": required_docs}
 
 
-async def make_llm_decision(application: Dict[str, Any], financial_data: str) -> Dict[str, Any]:
-    system_prompt = """You are a senior loan underwriter making final decisions. Based on the application and financial data:
-    1. Calculate a risk score (0-100, where 100 is lowest risk)
-    2. Make a decision: APPROVED, APPROVED_WITH_CONDITIONS, or REJECTED
-    3. Provide clear reasoning
-    4. List any conditions
-    Format your response as JSON"""
+def _extract_json_object(text: str) -> Optional[str]:
+    """Return the first balanced {...} block in text in a single pass, or None"""
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
 
-    prompt = f"APPLICATION: {json.dumps(application, indent=2)}\nFINANCIALS: {financial_data}"
-    response = await llm.generate(prompt, system_prompt)
 
+async def make_llm_decision(application: Dict[str, Any], financial_data: str) -> Dict[str, Any]:
+    prompt = f"APPLICATION: {orjson.dumps(application, option=orjson.OPT_INDENT_2).decode()}\nFINANCIALS: {financial_data}"
+    response = await llm.generate(prompt, _DECISION_SYSTEM_PROMPT)
+
+    json_text = _extract_json_object(response)
     try:
-        import re
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        decision_data = json.loads(json_match.group()) if json_match else {}
-    except:
+        decision_data = orjson.loads(json_text) if json_text else {}
+    except orjson.JSONDecodeError:
         decision_data = {}
 
     return {
@@ -78,6 +120,7 @@ async def make_llm_decision(application: Dict[str, Any], financial_data: str) ->
 @mcp.tool()
 async def analyze_loan_application(applicant_name: str, loan_amount: float, business_type: str, loan_purpose: str, years_in_business: int = 0, additional_info: str = "") -> str:
     global current_application
+    timestamp = now_iso()
     current_application = {
         "applicant_name": applicant_name,
         "loan_amount": loan_amount,
@@ -85,7 +128,7 @@ async def analyze_loan_application(applicant_name: str, loan_amount: float, busi
         "loan_purpose": loan_purpose,
         "years_in_business": years_in_business,
         "additional_info": additional_info,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": timestamp
     }
 
     analysis_steps = [
@@ -125,7 +168,7 @@ async def analyze_loan_application(applicant_name: str, loan_amount: float, busi
                     analysis_steps.append(f"\ud83d\udcdd Reasoning: {decision['reasoning']}")
                     if decision["conditions"]:
                         analysis_steps.append(f"\ud83d\udccb Conditions: {', '.join(decision['conditions'])}")
-                    decision_history.append({"application": current_application, "decision": decision, "timestamp": datetime.now().isoformat()})
+                    decision_history.append({"application": current_application, "decision": decision, "timestamp": timestamp})
                 else:
                     analysis_steps.append(f"\u274c Error fetching data: {fetch_response.get('error')}")
     else:
@@ -145,6 +188,23 @@ async def request_additional_documents(document_types: List[str], reason: str) -
     return f"\u2705 Documents Retrieved:\n{response['summary']}" if response["status"] == "success" else f"\u274c Error: {response.get('error')}"
 
 
+@mcp.tool()
+async def request_documents_batch(applications: List[Dict[str, Any]]) -> str:
+    # Each entry: {"id": <application id>, "data_types": [...]}; one A2A message for all
+    if not a2a_protocol:
+        return "Error: A2A Protocol not configured"
+    response = await a2a_protocol.send_message(
+        sender="underwriter", receiver="datafetcher", action="fetch_and_analyze_batch",
+        payload={"batches": applications}
+    )
+    if response["status"] != "success":
+        return f"\u274c Error: {response.get('error')}"
+    lines = ["\u2705 Documents Retrieved:"]
+    for app_id, summary in response["results"].items():
+        lines.extend([f"\n\U0001f4cb Application {app_id}:", summary])
+    return "\n".join(lines)
+
+
 @mcp.tool()
 async def search_applicant_info(applicant_name: str, business_name: str = "") -> str:
     if not a2a_protocol:
@@ -162,7 +222,7 @@ async def get_decision_history(limit: int = 5) -> str:
     if not decision_history:
         return "No decisions in history"
     lines = ["\ud83d\udcdc RECENT LOAN DECISIONS", "=" * 50]
-    for entry in decision_history[-limit:]:
+    for entry in islice(decision_history, max(0, len(decision_history) - limit), None):
         app, dec = entry["application"], entry["decision"]
         lines.extend([
             f"\n\ud83d\uddd3 {entry['timestamp']}",
@@ -179,6 +239,6 @@ async def human_underwriter_query(question: str, context: str = "") -> str:
     prompt = f"""As a senior underwriter, answer this:
     Question: {question}
     Context: {context}
-    Application: {json.dumps(current_application, indent=2) if current_application else 'None'}"""
+    Application: {orjson.dumps(current_application, option=orjson.OPT_INDENT_2).decode() if current_application else 'None'}"""
     response = await llm.generate(prompt)
     return f"\ud83d\udcad Underwriter Guidance:\n{response}"